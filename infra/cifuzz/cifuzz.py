@@ -18,8 +18,10 @@ This module helps CI tools do the following:
 Eventually it will be used to help CI tools determine which fuzzers to run.
 """
 
+import concurrent.futures
 import logging
 import os
+import re
 import shutil
 import sys
 
@@ -62,17 +64,67 @@ STACKTRACE_END_MARKERS = [
     'minidump has been written',
 ]
 
+# Compiled once so a fuzzer's output is scanned for all markers in one pass.
+# The output is matched as bytes, since sanitizer reports are not always valid
+# text. Markers are matched in a lookahead so that overlapping markers, e.g.
+# 'ASAN:' inside of 'KASAN:', are all found.
+STACKTRACE_TOOL_MARKERS_REGEX = re.compile(b'(?=(' + b'|'.join(
+    re.escape(marker.encode()) for marker in STACKTRACE_TOOL_MARKERS) + b'))')
+STACKTRACE_END_MARKERS_REGEX = re.compile(b'(?=(' + b'|'.join(
+    re.escape(marker.encode()) for marker in STACKTRACE_END_MARKERS) + b'))')
+
 # TODO: Turn default logging to WARNING when CIFuzz is stable
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.DEBUG)
 
 
+class Workspace:
+  """The directories CIFuzz uses inside of a workspace.
+
+  Attributes:
+    root: The location in a shared volume of the workspace.
+    storage: The location where the project repo is checked out.
+    out: The location of the build artifacts.
+    artifacts: The location where crash test cases and summaries are stored.
+    cache: The location of build caches kept between builds so unchanged
+      dependencies are not rebuilt.
+  """
+
+  def __init__(self, root):
+    """Represents the directories of a workspace.
+
+    Args:
+      root: The location in a shared volume of the workspace.
+    """
+    self.root = root
+    self.storage = os.path.join(root, 'storage')
+    self.out = os.path.join(root, 'out')
+    self.artifacts = os.path.join(self.out, 'artifacts')
+    self.cache = os.path.join(root, 'cache')
+
+  def create_dirs(self, directories):
+    """Creates directories of the workspace inside of its existing root.
+
+    Args:
+      directories: The workspace directories to create, parents first.
+
+    Raises:
+      OSError: when root is not an existing directory.
+    """
+    for directory in directories:
+      try:
+        os.mkdir(directory)
+      except FileExistsError:
+        pass
+
+
 def build_fuzzers(project_name,
                   project_repo_name,
                   workspace,
                   pr_ref=None,
-                  commit_sha=None):
+                  commit_sha=None,
+                  extra_mounts=None):
   """Builds all of the fuzzers for a specific OSS-Fuzz project.
 
   Args:
@@ -82,21 +134,24 @@ def build_fuzzers(project_name,
       artifacts.
     pr_ref: The pull request reference to be built.
     commit_sha: The commit sha for the project to be built at.
+    extra_mounts: A dict mapping host directories to directories in the build
+      container, e.g. to persist dependency caches between builds. Host
+      directories are paths on the Docker daemon's host. They are only created
+      here when CIFuzz itself is not running in a container.
 
   Returns:
     True if build succeeded or False on failure.
   """
   # Validate inputs.
   assert pr_ref or commit_sha
-  if not os.path.exists(workspace):
+  workspace_dirs = Workspace(workspace)
+  try:
+    workspace_dirs.create_dirs(
+        [workspace_dirs.storage, workspace_dirs.out, workspace_dirs.cache])
+  except OSError:
     logging.error('Invalid workspace: %s.', workspace)
     return False
 
-  git_workspace = os.path.join(workspace, 'storage')
-  os.makedirs(git_workspace, exist_ok=True)
-  out_dir = os.path.join(workspace, 'out')
-  os.makedirs(out_dir, exist_ok=True)
-
   # Detect repo information.
   inferred_url, oss_fuzz_repo_path = build_specified_commit.detect_main_repo(
       project_name, repo_name=project_repo_name)
@@ -106,10 +161,12 @@ def build_fuzzers(project_name,
   src_in_docker = os.path.dirname(oss_fuzz_repo_path)
   oss_fuzz_repo_name = os.path.basename(oss_fuzz_repo_path)
 
-  # Checkout projects repo in the shared volume.
+  # Checkout projects repo in the shared volume. Only the requested state is
+  # needed for the build, so the project's history is not cloned.
   build_repo_manager = repo_manager.RepoManager(inferred_url,
-                                                git_workspace,
-                                                repo_name=oss_fuzz_repo_name)
+                                                workspace_dirs.storage,
+                                                repo_name=oss_fuzz_repo_name,
+                                                depth=1)
   try:
     if pr_ref:
       build_repo_manager.checkout_pr(pr_ref)
@@ -129,19 +186,32 @@ def build_fuzzers(project_name,
   ]
   container = utils.get_container_name()
   if container:
-    command += ['-e', 'OUT=' + out_dir, '--volumes-from', container]
+    command += [
+        '-e', 'OUT=' + workspace_dirs.out, '-e',
+        'GOCACHE=' + os.path.join(workspace_dirs.cache, 'go-build'),
+        '--volumes-from', container
+    ]
     bash_command = 'rm -rf {0} && cp -r {1} {2} && compile'.format(
         os.path.join(src_in_docker, oss_fuzz_repo_name, '*'),
-        os.path.join(git_workspace, oss_fuzz_repo_name), src_in_docker)
+        os.path.join(workspace_dirs.storage, oss_fuzz_repo_name),
+        src_in_docker)
   else:
     command += [
         '-e', 'OUT=' + '/out', '-v',
-        '%s:%s' % (os.path.join(git_workspace, oss_fuzz_repo_name),
+        '%s:%s' % (os.path.join(workspace_dirs.storage, oss_fuzz_repo_name),
                    os.path.join(src_in_docker, oss_fuzz_repo_name)), '-v',
-        '%s:%s' % (out_dir, '/out')
+        '%s:%s' % (workspace_dirs.out, '/out'), '-v',
+        '%s:%s' % (workspace_dirs.cache, '/cache'), '-e',
+        'GOCACHE=/cache/go-build'
     ]
     bash_command = 'compile'
 
+  if extra_mounts:
+    for host_dir, container_dir in extra_mounts.items():
+      if not container:
+        os.makedirs(host_dir, exist_ok=True)
+      command += ['-v', '%s:%s' % (host_dir, container_dir)]
+
   command.extend([
       'gcr.io/oss-fuzz/' + project_name,
       '/bin/bash',
@@ -166,12 +236,13 @@ def run_fuzzers(fuzz_seconds, workspace):
     (True if run was successful, True if bug was found).
   """
   # Validate inputs.
-  if not os.path.exists(workspace):
+  workspace_dirs = Workspace(workspace)
+  try:
+    workspace_dirs.create_dirs([workspace_dirs.out, workspace_dirs.artifacts])
+  except OSError:
     logging.error('Invalid workspace: %s.', workspace)
     return False, False
-  out_dir = os.path.join(workspace, 'out')
-  artifacts_dir = os.path.join(out_dir, 'artifacts')
-  os.makedirs(artifacts_dir, exist_ok=True)
+  out_dir = workspace_dirs.out
   if not fuzz_seconds or fuzz_seconds < 1:
     logging.error('Fuzz_seconds argument must be greater than 1, but was: %s.',
                   format(fuzz_seconds))
@@ -183,47 +254,100 @@ def run_fuzzers(fuzz_seconds, workspace):
     logging.error('No fuzzers were found in out directory: %s.',
                   format(out_dir))
     return False, False
-  fuzz_seconds_per_target = fuzz_seconds // len(fuzzer_paths)
-
-  # Run fuzzers for alotted time.
-  for fuzzer_path in fuzzer_paths:
-    target = fuzz_target.FuzzTarget(fuzzer_path, fuzz_seconds_per_target,
-                                    out_dir)
-    test_case, stack_trace = target.fuzz()
-    if not test_case or not stack_trace:
-      logging.info('Fuzzer %s, finished running.', target.target_name)
-    else:
+
+  # Fuzz targets run concurrently, one per core. When there are more targets
+  # than cores, they run in several rounds that share the allotted time.
+  num_workers = min(len(fuzzer_paths), os.cpu_count() or 1)
+  num_rounds = -(-len(fuzzer_paths) // num_workers)
+  fuzz_seconds_per_target = fuzz_seconds // num_rounds
+  fuzz_targets = [
+      fuzz_target.FuzzTarget(fuzzer_path, fuzz_seconds_per_target, out_dir)
+      for fuzzer_path in fuzzer_paths
+  ]
+
+  # Run fuzzers for alotted time. The executor is not used as a context
+  # manager, so that a crash is reported without waiting for other fuzzers.
+  executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+  failed_target_names = []
+  future_to_target = {
+      executor.submit(target.fuzz): target for target in fuzz_targets
+  }
+  try:
+    for future in concurrent.futures.as_completed(future_to_target):
+      target = future_to_target[future]
+      try:
+        test_case, stack_trace = future.result()
+      except Exception:  # pylint: disable=broad-except
+        logging.exception('Fuzzer %s, failed to run.', target.target_name)
+        failed_target_names.append(target.target_name)
+        continue
+      if not test_case or not stack_trace:
+        logging.info('Fuzzer %s, finished running.', target.target_name)
+        continue
+
       logging.info('Fuzzer %s, detected error: %s.', target.target_name,
-                   stack_trace)
-      shutil.move(test_case, os.path.join(artifacts_dir, 'test_case'))
-      parse_fuzzer_output(stack_trace, artifacts_dir)
+                   stack_trace.decode(errors='replace'))
+      # The other fuzzers are not needed anymore. Ones that have not started
+      # are cancelled and running ones are stopped.
+      for other_future, other_target in future_to_target.items():
+        if not other_future.cancel() and not other_future.done():
+          other_target.stop()
+      shutil.move(test_case, os.path.join(workspace_dirs.artifacts,
+                                          'test_case'))
+      parse_fuzzer_output(stack_trace, workspace_dirs.artifacts)
       return True, True
+  finally:
+    executor.shutdown(wait=False)
+
+  if failed_target_names:
+    logging.error('Fuzzers failed to run: %s.', ', '.join(failed_target_names))
+    return False, False
   return True, False
 
 
+def _find_marker(markers, markers_regex, fuzzer_output, start=0):
+  """Finds the highest priority marker in a fuzz target binary output.
+
+  Args:
+    markers: The markers to look for, in order of priority.
+    markers_regex: A compiled regex capturing any of the markers in group 1.
+    fuzzer_output: The fuzz target binary output bytes to be searched.
+    start: The index in the output to start searching from.
+
+  Returns:
+    The match of the first occurrence of the highest priority marker, with the
+    marker in group 1, or None if no marker was found.
+  """
+  # Record where each marker first occurs in a single pass over the output.
+  first_matches = {}
+  for match in markers_regex.finditer(fuzzer_output, start):
+    first_matches.setdefault(match.group(1), match)
+  for marker in markers:
+    marker = marker.encode()
+    if marker in first_matches:
+      return first_matches[marker]
+  return None
+
+
 def parse_fuzzer_output(fuzzer_output, out_dir):
   """Parses the fuzzer output from a fuzz target binary.
 
   Args:
-    fuzzer_output: A fuzz target binary output string to be parsed.
+    fuzzer_output: The fuzz target binary output bytes to be parsed.
     out_dir: The location to store the parsed output files.
   """
   # Get index of key file points.
-  for marker in STACKTRACE_TOOL_MARKERS:
-    marker_index = fuzzer_output.find(marker)
-    if marker_index:
-      begin_summary = marker_index
-      break
-
-  end_summary = -1
-  for marker in STACKTRACE_END_MARKERS:
-    marker_index = fuzzer_output.find(marker)
-    if marker_index:
-      end_summary = marker_index + len(marker)
-      break
-
-  if begin_summary is None or end_summary is None:
+  begin_match = _find_marker(STACKTRACE_TOOL_MARKERS,
+                             STACKTRACE_TOOL_MARKERS_REGEX, fuzzer_output)
+  if not begin_match:
+    return
+  begin_summary = begin_match.start(1)
+
+  end_match = _find_marker(STACKTRACE_END_MARKERS, STACKTRACE_END_MARKERS_REGEX,
+                           fuzzer_output, begin_summary)
+  if not end_match:
     return
+  end_summary = end_match.end(1)
 
   summary_str = fuzzer_output[begin_summary:end_summary]
   if not summary_str:
@@ -231,5 +355,5 @@ def parse_fuzzer_output(fuzzer_output, out_dir):
 
   # Write sections of fuzzer output to specific files.
   summary_file_path = os.path.join(out_dir, 'bug_summary.txt')
-  with open(summary_file_path, 'a') as summary_handle:
+  with open(summary_file_path, 'ab') as summary_handle:
     summary_handle.write(summary_str)
@@ -19,6 +19,7 @@
 import os
 import sys
 import tempfile
+import threading
 import unittest
 import unittest.mock
 
@@ -32,6 +33,88 @@ import fuzz_target
 EXAMPLE_PROJECT = 'example'
 
 
+class WorkspaceUnitTest(unittest.TestCase):
+  """Test the Workspace class in the cifuzz module."""
+
+  def test_create_dirs(self):
+    """Tests that only the requested directories are created."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      workspace = cifuzz.Workspace(tmp_dir)
+      self.assertEqual(workspace.artifacts,
+                       os.path.join(tmp_dir, 'out', 'artifacts'))
+      workspace.create_dirs([workspace.out, workspace.artifacts])
+      self.assertCountEqual(os.listdir(tmp_dir), ['out'])
+      self.assertTrue(os.path.isdir(workspace.artifacts))
+
+      # Creating directories that already exist is not an error.
+      workspace.create_dirs([workspace.out, workspace.storage])
+      self.assertCountEqual(os.listdir(tmp_dir), ['out', 'storage'])
+
+  def test_create_dirs_invalid_root(self):
+    """Tests that creating directories in a missing root fails."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      workspace = cifuzz.Workspace(os.path.join(tmp_dir, 'not_a_dir'))
+      with self.assertRaises(OSError):
+        workspace.create_dirs([workspace.out])
+      self.assertEqual(os.listdir(tmp_dir), [])
+
+
+class BuildFuzzersUnitTest(unittest.TestCase):
+  """Test the docker arguments build_fuzzers passes to the build."""
+
+  def test_cache_mounts(self):
+    """Tests that build caches and extra mounts are mounted in the build."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      extra_dir = os.path.join(tmp_dir, 'cargo')
+      with unittest.mock.patch('build_specified_commit.detect_main_repo',
+                               return_value=('https://example.com/example.git',
+                                             '/src/example')):
+        with unittest.mock.patch('repo_manager.RepoManager'):
+          with unittest.mock.patch('utils.get_container_name',
+                                   return_value=None):
+            with unittest.mock.patch('helper.docker_run',
+                                     return_value=0) as mocked_docker_run:
+              self.assertTrue(
+                  cifuzz.build_fuzzers(
+                      EXAMPLE_PROJECT,
+                      'oss-fuzz',
+                      tmp_dir,
+                      commit_sha='0b95fe1039ed7c38fea1f97078316bfc1030c523',
+                      extra_mounts={extra_dir: '/rust/registry'}))
+      command = mocked_docker_run.call_args[0][0]
+      self.assertIn('%s:/cache' % os.path.join(tmp_dir, 'cache'), command)
+      self.assertIn('GOCACHE=/cache/go-build', command)
+      self.assertIn('%s:/rust/registry' % extra_dir, command)
+      self.assertTrue(os.path.isdir(extra_dir))
+
+  def test_cache_mounts_in_container(self):
+    """Tests the build cache when CIFuzz runs inside of a container."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      extra_dir = os.path.join(tmp_dir, 'cargo')
+      with unittest.mock.patch('build_specified_commit.detect_main_repo',
+                               return_value=('https://example.com/example.git',
+                                             '/src/example')):
+        with unittest.mock.patch('repo_manager.RepoManager'):
+          with unittest.mock.patch('utils.get_container_name',
+                                   return_value='cifuzz-container'):
+            with unittest.mock.patch('helper.docker_run',
+                                     return_value=0) as mocked_docker_run:
+              self.assertTrue(
+                  cifuzz.build_fuzzers(
+                      EXAMPLE_PROJECT,
+                      'oss-fuzz',
+                      tmp_dir,
+                      commit_sha='0b95fe1039ed7c38fea1f97078316bfc1030c523',
+                      extra_mounts={extra_dir: '/rust/registry'}))
+      command = mocked_docker_run.call_args[0][0]
+      self.assertIn('--volumes-from', command)
+      self.assertIn(
+          'GOCACHE=' + os.path.join(tmp_dir, 'cache', 'go-build'), command)
+      self.assertIn('%s:/rust/registry' % extra_dir, command)
+      # Extra mounts are paths on the Docker host, not in this container.
+      self.assertFalse(os.path.exists(extra_dir))
+
+
 class BuildFuzzersIntegrationTest(unittest.TestCase):
   """Test build_fuzzers function in the utils module."""
 
@@ -155,6 +238,132 @@ class RunFuzzersIntegrationTest(unittest.TestCase):
     self.assertFalse(bug_found)
 
 
+class RunFuzzersUnitTest(unittest.TestCase):
+  """Test how run_fuzzers schedules fuzz targets."""
+
+  def test_targets_fit_on_cores(self):
+    """Tests that every target gets the full time when run in one round."""
+    durations = {}
+
+    def fuzz(target):
+      durations[target.target_name] = target.duration
+      return None, None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      fuzzer_paths = [
+          os.path.join(tmp_dir, 'out', name) for name in ['a', 'b', 'c', 'd']
+      ]
+      with unittest.mock.patch('utils.get_fuzz_targets',
+                               return_value=fuzzer_paths):
+        with unittest.mock.patch('os.cpu_count', return_value=4):
+          with unittest.mock.patch.object(fuzz_target.FuzzTarget,
+                                          'fuzz',
+                                          autospec=True,
+                                          side_effect=fuzz):
+            run_success, bug_found = cifuzz.run_fuzzers(100, tmp_dir)
+    self.assertTrue(run_success)
+    self.assertFalse(bug_found)
+    self.assertEqual(durations, {'a': 100, 'b': 100, 'c': 100, 'd': 100})
+
+  def test_targets_run_in_rounds(self):
+    """Tests that rounds of targets share the time."""
+    durations = {}
+
+    def fuzz(target):
+      durations[target.target_name] = target.duration
+      return None, None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      fuzzer_paths = [
+          os.path.join(tmp_dir, 'out', name) for name in ['a', 'b', 'c', 'd']
+      ]
+      with unittest.mock.patch('utils.get_fuzz_targets',
+                               return_value=fuzzer_paths):
+        with unittest.mock.patch('os.cpu_count', return_value=2):
+          with unittest.mock.patch.object(fuzz_target.FuzzTarget,
+                                          'fuzz',
+                                          autospec=True,
+                                          side_effect=fuzz):
+            run_success, bug_found = cifuzz.run_fuzzers(100, tmp_dir)
+    self.assertTrue(run_success)
+    self.assertFalse(bug_found)
+    self.assertEqual(durations, {'a': 50, 'b': 50, 'c': 50, 'd': 50})
+
+  def test_first_crash_reported(self):
+    """Tests that the first crash found is reported and other fuzzers are
+    stopped."""
+    stopped = threading.Event()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+      def fuzz(target):
+        if target.target_name == 'b':
+          # Keeps fuzzing until it is stopped.
+          stopped.wait(10)
+          return None, None
+        test_case = os.path.join(tmp_dir, 'crash')
+        with open(test_case, 'w') as test_case_handle:
+          test_case_handle.write(target.target_name)
+        return test_case, b'AddressSanitizer: crash\nSUMMARY:'
+
+      fuzzer_paths = [os.path.join(tmp_dir, 'out', name) for name in ['a', 'b']]
+      with unittest.mock.patch('utils.get_fuzz_targets',
+                               return_value=fuzzer_paths):
+        with unittest.mock.patch('os.cpu_count', return_value=2):
+          with unittest.mock.patch.object(fuzz_target.FuzzTarget,
+                                          'fuzz',
+                                          autospec=True,
+                                          side_effect=fuzz):
+            with unittest.mock.patch.object(
+                fuzz_target.FuzzTarget,
+                'stop',
+                autospec=True,
+                side_effect=lambda target: stopped.set()):
+              run_success, bug_found = cifuzz.run_fuzzers(100, tmp_dir)
+      self.assertTrue(run_success)
+      self.assertTrue(bug_found)
+      with open(os.path.join(tmp_dir, 'out', 'artifacts',
+                             'test_case')) as test_case_handle:
+        self.assertEqual(test_case_handle.read(), 'a')
+
+  def test_fuzzer_error(self):
+    """Tests that an error in one target fails the run but the other targets
+    still run."""
+    fuzzed_targets = []
+
+    def fuzz(target):
+      if target.target_name == 'a':
+        raise RuntimeError('docker failed')
+      fuzzed_targets.append(target.target_name)
+      return None, None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      fuzzer_paths = [os.path.join(tmp_dir, 'out', name) for name in ['a', 'b']]
+      with unittest.mock.patch('utils.get_fuzz_targets',
+                               return_value=fuzzer_paths):
+        with unittest.mock.patch('os.cpu_count', return_value=2):
+          with unittest.mock.patch.object(fuzz_target.FuzzTarget,
+                                          'fuzz',
+                                          autospec=True,
+                                          side_effect=fuzz):
+            run_success, bug_found = cifuzz.run_fuzzers(100, tmp_dir)
+    self.assertFalse(run_success)
+    self.assertFalse(bug_found)
+    self.assertEqual(fuzzed_targets, ['b'])
+
+  def test_all_fuzzers_error(self):
+    """Tests that the run fails when every target fails to run."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      fuzzer_paths = [os.path.join(tmp_dir, 'out', name) for name in ['a', 'b']]
+      with unittest.mock.patch('utils.get_fuzz_targets',
+                               return_value=fuzzer_paths):
+        with unittest.mock.patch.object(fuzz_target.FuzzTarget,
+                                        'fuzz',
+                                        side_effect=OSError('no docker')):
+          run_success, bug_found = cifuzz.run_fuzzers(100, tmp_dir)
+    self.assertFalse(run_success)
+    self.assertFalse(bug_found)
+
+
 class ParseOutputUnitTest(unittest.TestCase):
   """Test parse_fuzzer_output function in the cifuzz module."""
 
@@ -165,7 +374,7 @@ class ParseOutputUnitTest(unittest.TestCase):
     test_output_path = os.path.join(test_case_path, 'example_fuzzer_output.txt')
     test_summary_path = os.path.join(test_case_path, 'bug_summary_example.txt')
     with tempfile.TemporaryDirectory() as tmp_dir:
-      with open(test_output_path, 'r') as test_fuzz_output:
+      with open(test_output_path, 'rb') as test_fuzz_output:
         cifuzz.parse_fuzzer_output(test_fuzz_output.read(), tmp_dir)
       result_files = ['bug_summary.txt']
       self.assertCountEqual(os.listdir(tmp_dir), result_files)
@@ -180,9 +389,34 @@ class ParseOutputUnitTest(unittest.TestCase):
   def test_parse_invalid_output(self):
     """Checks that no files are created when an invalid input was given."""
     with tempfile.TemporaryDirectory() as tmp_dir:
-      cifuzz.parse_fuzzer_output('not a valid output_string', tmp_dir)
+      cifuzz.parse_fuzzer_output(b'not a valid output_string', tmp_dir)
       self.assertEqual(len(os.listdir(tmp_dir)), 0)
 
+  def test_parse_output_starting_with_marker(self):
+    """Checks that a marker at the very start of the output is detected."""
+    fuzzer_output = b'AddressSanitizer: heap-buffer-overflow\n==12==ABORTING'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      cifuzz.parse_fuzzer_output(fuzzer_output, tmp_dir)
+      with open(os.path.join(tmp_dir, 'bug_summary.txt'), 'rb') as bug_summary:
+        self.assertEqual(bug_summary.read(), fuzzer_output)
+
+  def test_parse_output_with_overlapping_markers(self):
+    """Checks that a marker inside of another marker is still detected."""
+    fuzzer_output = b'KASAN: use-after-free\nASAN: x\nSUMMARY: done'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      cifuzz.parse_fuzzer_output(fuzzer_output, tmp_dir)
+      with open(os.path.join(tmp_dir, 'bug_summary.txt'), 'rb') as bug_summary:
+        self.assertEqual(bug_summary.read(),
+                         b'ASAN: use-after-free\nASAN: x\nSUMMARY:')
+
+  def test_parse_output_with_invalid_text(self):
+    """Checks that output that is not valid UTF-8 can be parsed."""
+    fuzzer_output = b'AddressSanitizer: READ of \xff\xfe\n==12==ABORTING'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      cifuzz.parse_fuzzer_output(fuzzer_output, tmp_dir)
+      with open(os.path.join(tmp_dir, 'bug_summary.txt'), 'rb') as bug_summary:
+        self.assertEqual(bug_summary.read(), fuzzer_output)
+
 
 class ReproduceIntegrationTest(unittest.TestCase):
   """Test that only reproducible bugs are reported by CIFuzz."""
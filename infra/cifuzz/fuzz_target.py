@@ -17,6 +17,8 @@ import os
 import re
 import subprocess
 import sys
+import threading
+import uuid
 
 # pylint: disable=wrong-import-position
 # pylint: disable=import-error
@@ -28,7 +30,21 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.DEBUG)
 
-LIBFUZZER_OPTIONS = '-seed=1337 -len_control=0'
+# The seconds a single input may run for before libFuzzer reports a timeout.
+LIBFUZZER_TIMEOUT_SECONDS = 25
+
+# Per-input timeout and memory limits match ClusterFuzz's defaults, so a
+# single slow or leaking input can't stall a fuzzer for the whole run.
+LIBFUZZER_OPTIONS = ('-seed=1337 -len_control=0 -timeout={0} '
+                     '-rss_limit_mb=2560').format(LIBFUZZER_TIMEOUT_SECONDS)
+
+# Extra time a fuzzer run is given over its duration to start the container
+# and report a crash before it is killed.
+FUZZ_TIMEOUT_GRACE_SECONDS = 30
+
+# The seconds a single reproduce attempt may take before it is killed.
+REPRODUCE_TIMEOUT_SECONDS = (LIBFUZZER_TIMEOUT_SECONDS +
+                             FUZZ_TIMEOUT_GRACE_SECONDS)
 
 # The number of reproduce attempts for a crash.
 REPRODUCE_ATTEMPTS = 10
@@ -41,6 +57,8 @@ class FuzzTarget:
     target_name: The name of the fuzz target.
     duration: The length of time in seconds that the target should run.
     target_path: The location of the fuzz target binary.
+    container_name: The unique name of the docker container the target is
+      fuzzed in.
   """
 
   def __init__(self, target_path, duration, out_dir):
@@ -55,16 +73,25 @@ class FuzzTarget:
     self.duration = duration
     self.target_path = target_path
     self.out_dir = out_dir
+    self.container_name = 'cifuzz-{0}-{1}'.format(self.target_name,
+                                                  uuid.uuid4().hex)
+    self._stopped = False
+    self._stop_lock = threading.Lock()
 
   def fuzz(self):
     """Starts the fuzz target run for the length of time specified by duration.
 
     Returns:
-      (test_case, stack trace) if found or (None, None) on timeout or error.
+      (test_case, stack trace bytes) if found or (None, None) on timeout or
+      error.
     """
     logging.info('Fuzzer %s, started.', self.target_name)
+    # libFuzzer treats -max_total_time=0 as no time limit.
+    max_total_time = max(self.duration, 1)
     docker_container = utils.get_container_name()
-    command = ['docker', 'run', '--rm', '--privileged']
+    command = [
+        'docker', 'run', '--rm', '--privileged', '--name', self.container_name
+    ]
     if docker_container:
       command += [
           '--volumes-from', docker_container, '-e', 'OUT=' + self.out_dir
@@ -75,31 +102,62 @@ class FuzzTarget:
     command += [
         '-e', 'FUZZING_ENGINE=libfuzzer', '-e', 'SANITIZER=address', '-e',
         'RUN_FUZZER_MODE=interactive', 'gcr.io/oss-fuzz-base/base-runner',
-        'bash', '-c', 'run_fuzzer {fuzz_target} {options}'.format(
-            fuzz_target=self.target_name, options=LIBFUZZER_OPTIONS)
+        'bash', '-c',
+        'run_fuzzer {fuzz_target} {options} -max_total_time={duration}'.format(
+            fuzz_target=self.target_name,
+            options=LIBFUZZER_OPTIONS,
+            duration=max_total_time)
     ]
-    logging.info('Running command: %s', ' '.join(command))
-    process = subprocess.Popen(command,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
-
+    # The lock makes sure a fuzzer is either not started or its container is
+    # killed by stop().
+    with self._stop_lock:
+      if self._stopped:
+        logging.info('Fuzzer %s, stopped before it started.', self.target_name)
+        return None, None
+      logging.info('Running command: %s', ' '.join(command))
+      process = subprocess.Popen(command,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+
+    # libFuzzer stops itself after max_total_time. The fuzzer is killed if it
+    # overruns that anyway, e.g. when it hangs before fuzzing starts. Killing
+    # the docker client does not stop the container, so it is killed by name.
     try:
-      _, err = process.communicate(timeout=self.duration)
+      _, err = process.communicate(timeout=max_total_time +
+                                   FUZZ_TIMEOUT_GRACE_SECONDS)
     except subprocess.TimeoutExpired:
+      logging.error('Fuzzer %s, did not stop in time and was killed.',
+                    self.target_name)
+      self.stop()
+      process.kill()
+      process.communicate()
+      return None, None
+
+    if not process.returncode:
       logging.info('Fuzzer %s, finished with timeout.', self.target_name)
       return None, None
 
+    if self._stopped:
+      logging.info('Fuzzer %s, was stopped.', self.target_name)
+      return None, None
+
     logging.info('Fuzzer %s, ended before timeout.', self.target_name)
-    err_str = err.decode('ascii')
-    test_case = self.get_test_case(err_str)
+    test_case = self.get_test_case(err)
     if not test_case:
-      logging.error('No test case found in stack trace.', file=sys.stderr)
+      logging.error('No test case found in stack trace.')
       return None, None
     if self.is_reproducible(test_case):
-      return test_case, err_str
+      return test_case, err
     logging.error('A crash was found but it was not reproducible.')
     return None, None
 
+  def stop(self):
+    """Stops the fuzz target. A fuzzer that has not started yet will not be
+    started, a running one is killed and no crash of it is reproduced."""
+    with self._stop_lock:
+      self._stopped = True
+    utils.execute(['docker', 'kill', self.container_name])
+
   def is_reproducible(self, test_case):
     """Checks if the test case reproduces.
 
@@ -109,14 +167,26 @@ class FuzzTarget:
       Returns:
         True if crash is reproducible.
     """
-    command = [
-        'docker', 'run', '--rm', '--privileged', '-v',
-        '%s:/out' % os.path.dirname(self.target_path), '-v',
-        '%s:/testcase' % test_case, '-t', 'gcr.io/oss-fuzz-base/base-runner',
-        'reproduce', self.target_name, '-runs=100'
-    ]
-    for _ in range(REPRODUCE_ATTEMPTS):
-      _, _, err_code = utils.execute(command)
+    for attempt in range(REPRODUCE_ATTEMPTS):
+      if self._stopped:
+        return False
+      container_name = '{0}-reproduce-{1}'.format(self.container_name, attempt)
+      command = [
+          'docker', 'run', '--rm', '--privileged', '--name', container_name,
+          '-v',
+          '%s:/out' % os.path.dirname(self.target_path), '-v',
+          '%s:/testcase' % test_case, '-t', 'gcr.io/oss-fuzz-base/base-runner',
+          'reproduce', self.target_name, '-runs=100',
+          '-timeout=%s' % LIBFUZZER_TIMEOUT_SECONDS
+      ]
+      try:
+        _, _, err_code = utils.execute(command,
+                                       timeout=REPRODUCE_TIMEOUT_SECONDS)
+      except subprocess.TimeoutExpired:
+        logging.error('Reproducing crash of %s, did not finish in time.',
+                      self.target_name)
+        utils.execute(['docker', 'kill', container_name])
+        return False
       if err_code:
         return True
     return False
@@ -125,12 +195,12 @@ class FuzzTarget:
     """Gets the file from a fuzzer run stack trace.
 
     Args:
-      error_string: The stack trace string containing the error.
+      error_string: The stack trace bytes containing the error.
 
     Returns:
       The error test case or None if not found.
     """
-    match = re.search(r'\bTest unit written to \.\/([^\s]+)', error_string)
+    match = re.search(rb'\bTest unit written to \.\/([^\s]+)', error_string)
     if match:
-      return os.path.join(self.out_dir, match.group(1))
+      return os.path.join(self.out_dir, match.group(1).decode())
     return None
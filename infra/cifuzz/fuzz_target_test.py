@@ -14,6 +14,7 @@
 """Test the functionality of the fuzz_target module."""
 
 import os
+import subprocess
 import sys
 import unittest
 import unittest.mock
@@ -43,15 +44,17 @@ class IsReproducibleUnitTest(unittest.TestCase):
     test_all_success = [(0, 0, 1)] * 10
     all_success_mock = unittest.mock.Mock()
     all_success_mock.side_effect = test_all_success
-    utils.execute = all_success_mock
-    self.assertTrue(self.test_target.is_reproducible('/fake/path/to/testcase'))
+    with unittest.mock.patch.object(utils, 'execute', all_success_mock):
+      self.assertTrue(
+          self.test_target.is_reproducible('/fake/path/to/testcase'))
     self.assertEqual(1, all_success_mock.call_count)
 
     test_one_success = [(0, 0, 0)] * 9 + [(0, 0, 1)]
     one_success_mock = unittest.mock.Mock()
     one_success_mock.side_effect = test_one_success
-    utils.execute = one_success_mock
-    self.assertTrue(self.test_target.is_reproducible('/fake/path/to/testcase'))
+    with unittest.mock.patch.object(utils, 'execute', one_success_mock):
+      self.assertTrue(
+          self.test_target.is_reproducible('/fake/path/to/testcase'))
     self.assertEqual(10, one_success_mock.call_count)
 
   def test_with_not_reproducible(self):
@@ -59,8 +62,134 @@ class IsReproducibleUnitTest(unittest.TestCase):
     test_all_fail = [(0, 0, 0)] * 10
     all_fail_mock = unittest.mock.Mock()
     all_fail_mock.side_effect = test_all_fail
-    utils.execute = all_fail_mock
-    self.assertFalse(self.test_target.is_reproducible('/fake/path/to/testcase'))
+    with unittest.mock.patch.object(utils, 'execute', all_fail_mock):
+      self.assertFalse(
+          self.test_target.is_reproducible('/fake/path/to/testcase'))
+
+  def test_with_reproduce_timeout(self):
+    """Tests that a reproduce run that does not finish in time is killed."""
+    timeout_mock = unittest.mock.Mock()
+    timeout_mock.side_effect = [
+        subprocess.TimeoutExpired('docker', 55), ('', '', 0)
+    ]
+    with unittest.mock.patch.object(utils, 'execute', timeout_mock):
+      self.assertFalse(
+          self.test_target.is_reproducible('/fake/path/to/testcase'))
+    reproduce_command = timeout_mock.call_args_list[0][0][0]
+    self.assertIn('-timeout=25', reproduce_command)
+    self.assertEqual(timeout_mock.call_args_list[0][1],
+                     {'timeout': fuzz_target.REPRODUCE_TIMEOUT_SECONDS})
+    self.assertEqual(timeout_mock.call_args_list[1][0][0][:2],
+                     ['docker', 'kill'])
+
+  def test_with_non_ascii_output(self):
+    """Tests that a crash whose report is not valid text is reproducible."""
+    process = unittest.mock.Mock(returncode=1)
+    process.communicate.return_value = (b'', b'==1==ERROR: \xff\xfe')
+    with unittest.mock.patch('subprocess.Popen', return_value=process):
+      self.assertTrue(
+          self.test_target.is_reproducible('/fake/path/to/testcase'))
+
+
+class FuzzUnitTest(unittest.TestCase):
+  """Test fuzz function in the fuzz_target module."""
+
+  def setUp(self):
+    """Sets up dummy fuzz target to test fuzz method."""
+    self.test_target = fuzz_target.FuzzTarget('/example/path', 10,
+                                              '/example/outdir')
+
+  def test_no_crash(self):
+    """Tests that a fuzzer that exits cleanly reports no crash."""
+    process = unittest.mock.Mock(returncode=0)
+    process.communicate.return_value = (b'', b'Done 1000 runs in 10 second(s)')
+    with unittest.mock.patch.object(utils,
+                                    'get_container_name',
+                                    return_value=None):
+      with unittest.mock.patch('subprocess.Popen',
+                               return_value=process) as mocked_popen:
+        self.assertEqual(self.test_target.fuzz(), (None, None))
+    command = mocked_popen.call_args[0][0]
+    self.assertIn('-max_total_time=10', command[-1])
+    self.assertIn(self.test_target.container_name, command)
+
+  def test_crash(self):
+    """Tests that the test case of a reproducible crash is returned."""
+    stack_trace = b'ERROR: AddressSanitizer\nTest unit written to ./crash-1'
+    process = unittest.mock.Mock(returncode=1)
+    process.communicate.return_value = (b'', stack_trace)
+    with unittest.mock.patch.object(utils,
+                                    'get_container_name',
+                                    return_value=None):
+      with unittest.mock.patch('subprocess.Popen', return_value=process):
+        with unittest.mock.patch.object(fuzz_target.FuzzTarget,
+                                        'is_reproducible',
+                                        return_value=True):
+          self.assertEqual(self.test_target.fuzz(),
+                           ('/example/outdir/crash-1', stack_trace))
+
+  def test_timeout(self):
+    """Tests that a fuzzer that overruns its time is killed."""
+    process = unittest.mock.Mock(returncode=None)
+    process.communicate.side_effect = [
+        subprocess.TimeoutExpired('docker', 40), (b'', b'')
+    ]
+    with unittest.mock.patch.object(utils,
+                                    'get_container_name',
+                                    return_value=None):
+      with unittest.mock.patch('subprocess.Popen', return_value=process):
+        with unittest.mock.patch.object(
+            utils, 'execute', return_value=('', '', 0)) as mocked_execute:
+          self.assertEqual(self.test_target.fuzz(), (None, None))
+    mocked_execute.assert_called_once_with(
+        ['docker', 'kill', self.test_target.container_name])
+    process.kill.assert_called_once_with()
+    self.assertEqual(process.communicate.call_count, 2)
+
+  def test_stopped_before_start(self):
+    """Tests that a stopped fuzzer is not started."""
+    with unittest.mock.patch.object(utils,
+                                    'execute',
+                                    return_value=('', '', 0)):
+      self.test_target.stop()
+    with unittest.mock.patch('subprocess.Popen') as mocked_popen:
+      self.assertEqual(self.test_target.fuzz(), (None, None))
+    mocked_popen.assert_not_called()
+
+  def test_stopped_while_fuzzing(self):
+    """Tests that the crash of a fuzzer stopped while running is not
+    reproduced."""
+    process = unittest.mock.Mock(returncode=137)
+
+    def communicate(timeout):  # pylint: disable=unused-argument
+      with unittest.mock.patch.object(utils,
+                                      'execute',
+                                      return_value=('', '', 0)):
+        self.test_target.stop()
+      return b'', b'Test unit written to ./crash-1'
+
+    process.communicate.side_effect = communicate
+    with unittest.mock.patch.object(utils,
+                                    'get_container_name',
+                                    return_value=None):
+      with unittest.mock.patch('subprocess.Popen', return_value=process):
+        with unittest.mock.patch.object(
+            fuzz_target.FuzzTarget, 'is_reproducible') as mocked_reproducible:
+          self.assertEqual(self.test_target.fuzz(), (None, None))
+    mocked_reproducible.assert_not_called()
+
+  def test_zero_duration(self):
+    """Tests that a zero duration does not disable libFuzzer's time limit."""
+    self.test_target.duration = 0
+    process = unittest.mock.Mock(returncode=0)
+    process.communicate.return_value = (b'', b'')
+    with unittest.mock.patch.object(utils,
+                                    'get_container_name',
+                                    return_value=None):
+      with unittest.mock.patch('subprocess.Popen',
+                               return_value=process) as mocked_popen:
+        self.test_target.fuzz()
+    self.assertIn('-max_total_time=1', mocked_popen.call_args[0][0][-1])
 
 
 class GetTestCaseUnitTest(unittest.TestCase):
@@ -75,7 +204,7 @@ class GetTestCaseUnitTest(unittest.TestCase):
     """Tests that get_test_case returns the correct test case give an error."""
     test_case_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                   'test_files', 'example_fuzzer_output.txt')
-    with open(test_case_path, 'r') as test_fuzz_output:
+    with open(test_case_path, 'rb') as test_fuzz_output:
       parsed_test_case = self.test_target.get_test_case(test_fuzz_output.read())
     self.assertEqual(
         parsed_test_case,
@@ -83,8 +212,8 @@ class GetTestCaseUnitTest(unittest.TestCase):
 
   def test_with_invalid_error_string(self):
     """Tests that get_test_case will return None with a bad error string."""
-    self.assertIsNone(self.test_target.get_test_case(''))
-    self.assertIsNone(self.test_target.get_test_case(' Example crash string.'))
+    self.assertIsNone(self.test_target.get_test_case(b''))
+    self.assertIsNone(self.test_target.get_test_case(b' Example crash string.'))
 
 
 if __name__ == '__main__':
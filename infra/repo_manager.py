@@ -21,6 +21,7 @@ a python API and manage the current state of the git repo.
     r_man =  RepoManager('https://github.com/google/oss-fuzz.git')
     r_man.checkout('5668cc422c2c92d38a370545d3591039fb5bb8d4')
 """
+import logging
 import os
 import shutil
 
@@ -35,18 +36,22 @@ class RepoManager:
     base_dir: The location of where the repo clone is stored locally.
     repo_name: The name of the GitHub project.
     repo_dir: The location of the main repo.
+    depth: The number of commits of history to fetch, or None for all.
   """
 
-  def __init__(self, repo_url, base_dir, repo_name=None):
+  def __init__(self, repo_url, base_dir, repo_name=None, depth=None):
     """Constructs a repo manager class.
 
     Args:
       repo_url: The github url needed to clone.
       base_dir: The full file-path where the git repo is located.
       repo_name: The name of the directory the repo is cloned to.
+      depth: If set, only this many commits of history are cloned and
+        checkouts fetch just the requested state instead of all history.
     """
     self.repo_url = repo_url
     self.base_dir = base_dir
+    self.depth = depth
     if repo_name:
       self.repo_name = repo_name
     else:
@@ -60,11 +65,13 @@ class RepoManager:
       Raises:
         ValueError: when the repo is not able to be cloned.
     """
-    if not os.path.exists(self.base_dir):
-      os.makedirs(self.base_dir)
+    os.makedirs(self.base_dir, exist_ok=True)
     self.remove_repo()
-    out, _, _ = utils.execute(['git', 'clone', self.repo_url, self.repo_name],
-                              location=self.base_dir)
+    command = ['git', 'clone']
+    if self.depth:
+      command += ['--depth', str(self.depth)]
+    command += [self.repo_url, self.repo_name]
+    utils.execute(command, location=self.base_dir)
     if not self._is_git_repo():
       raise ValueError('%s is not a git repo' % self.repo_url)
 
@@ -145,14 +152,29 @@ class RepoManager:
                     self.repo_dir,
                     check_result=True)
 
+  def _fetch_command(self, ref):
+    """Gets the command to fetch a ref from the remote repo.
+
+    Args:
+      ref: The ref or commit SHA to be fetched.
+
+    Returns:
+      The git fetch command as a list.
+    """
+    command = ['git', 'fetch']
+    if self.depth:
+      command += ['--depth', str(self.depth)]
+    return command + ['origin', ref]
+
   def checkout_pr(self, pr_ref):
     """Checks out a remote pull request.
 
     Args:
       pr_ref: The pull request reference to be checked out.
     """
-    self.fetch_unshallow()
-    utils.execute(['git', 'fetch', 'origin', pr_ref],
+    if not self.depth:
+      self.fetch_unshallow()
+    utils.execute(self._fetch_command(pr_ref),
                   self.repo_dir,
                   check_result=True)
     utils.execute(['git', 'checkout', '-f', 'FETCH_HEAD'],
@@ -166,10 +188,21 @@ class RepoManager:
       commit: The commit SHA to be checked out.
 
     Raises:
-      RuntimeError: when checkout is not successful.
+      RuntimeError: when fetching or checking out the commit is not successful.
       ValueError: when commit does not exist.
     """
-    self.fetch_unshallow()
+    if self.depth:
+      # A shallow clone only has the commits that were explicitly fetched.
+      # Not every remote allows fetching a commit that is not advertised by a
+      # ref, so fall back to fetching the full history.
+      _, err, err_code = utils.execute(self._fetch_command(commit),
+                                       self.repo_dir)
+      if err_code:
+        logging.warning('Could not fetch commit %s, fetching full history: %s',
+                        commit, err)
+        self.fetch_unshallow()
+    else:
+      self.fetch_unshallow()
     if not self.commit_exists(commit):
       raise ValueError('Commit %s does not exist in current branch' % commit)
     utils.execute(['git', 'checkout', '-f', commit],
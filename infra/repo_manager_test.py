@@ -15,6 +15,7 @@
 
 import os
 import unittest
+import unittest.mock
 import tempfile
 
 import repo_manager
@@ -61,6 +62,44 @@ class RepoManagerCheckoutUnitTests(unittest.TestCase):
       test_repo_manager.checkout_commit(commit_to_test)
       self.assertEqual(commit_to_test, test_repo_manager.get_current_commit())
 
+  def test_checkout_valid_commit_shallow(self):
+    """Tests that a commit can be checked out from a shallow clone."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      test_repo_manager = repo_manager.RepoManager(OSS_FUZZ_REPO,
+                                                   tmp_dir,
+                                                   depth=1)
+      commit_to_test = '04ea24ee15bbe46a19e5da6c5f022a2ffdfbdb3b'
+      test_repo_manager.checkout_commit(commit_to_test)
+      self.assertEqual(commit_to_test, test_repo_manager.get_current_commit())
+
+  def test_checkout_commit_shallow_fetch_fails(self):
+    """Tests that a shallow clone falls back to the full history when the
+    commit can not be fetched directly."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      test_repo_manager = repo_manager.RepoManager(OSS_FUZZ_REPO,
+                                                   tmp_dir,
+                                                   depth=1)
+      commit_to_test = '04ea24ee15bbe46a19e5da6c5f022a2ffdfbdb3b'
+      with unittest.mock.patch.object(
+          test_repo_manager,
+          '_fetch_command',
+          return_value=['git', 'fetch', 'origin', 'refs/not/a/ref']):
+        test_repo_manager.checkout_commit(commit_to_test)
+      self.assertEqual(commit_to_test, test_repo_manager.get_current_commit())
+      self.assertFalse(
+          os.path.exists(os.path.join(test_repo_manager.repo_dir, '.git',
+                                      'shallow')))
+
+  def test_checkout_invalid_commit_shallow(self):
+    """Tests that checking out an invalid commit in a shallow clone fails."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      test_repo_manager = repo_manager.RepoManager(OSS_FUZZ_REPO,
+                                                   tmp_dir,
+                                                   depth=1)
+      with self.assertRaises(ValueError):
+        test_repo_manager.checkout_commit(
+            'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa')
+
   def test_checkout_invalid_commit(self):
     """Tests that the git checkout invalid commit fails."""
     with tempfile.TemporaryDirectory() as tmp_dir:
@@ -120,6 +159,16 @@ class RepoManagerCheckoutPullRequestUnitTests(unittest.TestCase):
       self.assertEqual(test_repo_manager.get_current_commit(),
                        '2a2b11cc3d370db8f7bdf73046f3290a39615347')
 
+  def test_checkout_pull_request_shallow(self):
+    """Tests that a pull request can be checked out from a shallow clone."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      test_repo_manager = repo_manager.RepoManager(OSS_FUZZ_REPO,
+                                                   tmp_dir,
+                                                   depth=1)
+      test_repo_manager.checkout_pr('refs/pull/1757/merge')
+      self.assertEqual(test_repo_manager.get_current_commit(),
+                       '2a2b11cc3d370db8f7bdf73046f3290a39615347')
+
   def test_checkout_invalid_pull_request(self):
     """Tests that the git checkout invalid pull request fails."""
     with tempfile.TemporaryDirectory() as tmp_dir:
@@ -33,19 +33,22 @@ def chdir_to_root():
     os.chdir(helper.OSSFUZZ_DIR)
 
 
-def execute(command, location=None, check_result=False):
+def execute(command, location=None, check_result=False, timeout=None):
   """ Runs a shell command in the specified directory location.
 
   Args:
     command: The command as a list to be run.
     location: The directory the command is run in.
     check_result: Should an exception be thrown on failed command.
+    timeout: The seconds after which the command is killed, or None to wait
+      until it finishes.
 
   Returns:
     stdout, stderr, error code.
 
   Raises:
     RuntimeError: running a command resulted in an error.
+    subprocess.TimeoutExpired: the command did not finish within timeout.
   """
 
   if not location:
@@ -54,9 +57,15 @@ def execute(command, location=None, check_result=False):
                              stdout=subprocess.PIPE,
                              stderr=subprocess.PIPE,
                              cwd=location)
-  out, err = process.communicate()
-  out = out.decode('ascii')
-  err = err.decode('ascii')
+  try:
+    out, err = process.communicate(timeout=timeout)
+  except subprocess.TimeoutExpired:
+    process.kill()
+    process.communicate()
+    raise
+  # Output such as sanitizer reports is not always valid text.
+  out = out.decode('ascii', errors='replace')
+  err = err.decode('ascii', errors='replace')
   if err:
     logging.debug('Stderr of command \'%s\' is %s.', ' '.join(command), err)
   if check_result and process.returncode: